@@ -5,120 +5,423 @@ Main Flask application entry point
 """
 
 from flask import Flask, request, jsonify, render_template
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import sqlite3
 import csv
-import io
-from datetime import datetime, timedelta
+import codecs
+from datetime import datetime, timezone
 import random
 import os
 import atexit
+import concurrent.futures
+import queue
 import signal
+import threading
+import time
+import zlib
+from connection_pool import ConnectionPool
 from definition_service import definition_service
-from question_preloader import question_preloader
+from question_preloader import question_preloader, SQL_UNSEEN_WORD_CTES
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is used without it
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify() backed by orjson, output-compatible with the default provider"""
+
+    # Sorted keys like the default provider; datetimes still go through
+    # Flask's default hook so they keep the HTTP date format
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype,
+        )
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)
 
+# SRS intervals in days
+SRS_INTERVALS = (0, 1, 3, 7, 14)
+
+def srs_next_index(current_index, is_correct):
+    """Next SRS step: advance on a correct answer, restart on a wrong one"""
+    if is_correct:
+        return min((current_index or 0) + 1, len(SRS_INTERVALS) - 1)
+    return 0  # Reset to beginning if incorrect
+
+def srs_days(index):
+    """Days until the next review at an SRS step"""
+    return SRS_INTERVALS[index]
+
+def _register_sql_functions(conn):
+    """Expose the SRS helpers to SQL on every pooled connection"""
+    conn.create_function('srs_next_index', 2, srs_next_index, deterministic=True)
+    conn.create_function('srs_days', 1, srs_days, deterministic=True)
+
 # Database configuration
 DATABASE = 'lexiboost.db'
+db_pool = ConnectionPool(DATABASE, on_connect=_register_sql_functions)
+
+def _ensure_user_words_unique_index():
+    """Create the one-row-per-(user, word) index on databases that predate it
+
+    The answer upsert and the wrongbook import both name it as their
+    ON CONFLICT(user_id, word_id) target, so without it every answer and
+    import fails. deploy/init_db.py creates it too, but only when re-run
+    by hand; duplicates are dropped first, keeping the oldest row.
+    """
+    with db_pool.connection() as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_words'").fetchone():
+            return  # no schema yet; deploy/init_db.py creates table and index
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_user_words_user_word'").fetchone():
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        removed = conn.execute('''
+            DELETE FROM user_words
+            WHERE id NOT IN (SELECT MIN(id) FROM user_words GROUP BY user_id, word_id)
+        ''').rowcount
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_user_words_user_word ON user_words(user_id, word_id)')
+        conn.commit()
+    print(f"[INFO] Added unique index on user_words(user_id, word_id); removed {removed} duplicate rows")
+
+_ensure_user_words_unique_index()
+
+# Hot-path SQL, kept as module constants so every call reuses the exact
+# same text (and therefore sqlite3's per-connection statement cache)
+SQL_GET_SESSION = 'SELECT user_id, total_questions FROM sessions WHERE id = ?'
+
+SQL_GET_WORD = 'SELECT word, level FROM words WHERE id = ?'
+
+# get_question fallback: one round-trip returns due wrongbook candidates
+# and unseen candidates (sampled as in the preloader, see
+# SQL_UNSEEN_WORD_CTES), both excluding words already asked in this
+# session (probed per word through idx_qa_session_word).
+SQL_FALLBACK_CANDIDATES = '''
+    WITH wb AS (
+        SELECT w.id, w.word, w.level
+        FROM words w
+        JOIN user_words uw ON w.id = uw.word_id
+        WHERE uw.user_id = :user_id AND uw.in_wrongbook = 1
+          AND (uw.next_review IS NULL OR uw.next_review <= datetime('now'))
+          AND TRIM(w.word) <> ''
+          AND NOT EXISTS (SELECT 1 FROM question_attempts qa
+                          WHERE qa.session_id = :session_id AND qa.word_id = w.id)
+        ORDER BY uw.next_review ASC
+        LIMIT 50
+    ),''' + SQL_UNSEEN_WORD_CTES + '''
+    SELECT 'wb' AS src, id, word, level FROM wb
+    UNION ALL
+    SELECT 'un', id, word, level FROM un
+'''
+
+# Only run when SQL_FALLBACK_CANDIDATES comes back empty, to tell the
+# client why the session is over; the unseen count scans every word.
+SQL_FALLBACK_EMPTY_COUNTS = '''
+    SELECT (SELECT COUNT(*) FROM user_words uw
+            JOIN words w ON w.id = uw.word_id
+            WHERE uw.user_id = :user_id AND uw.in_wrongbook = 1
+              AND (uw.next_review IS NULL OR uw.next_review <= datetime('now'))
+              AND TRIM(w.word) <> '') AS total_wrongbook,
+           (SELECT COUNT(*) FROM words w
+            LEFT JOIN user_words uw ON uw.word_id = w.id AND uw.user_id = :user_id
+            WHERE uw.word_id IS NULL AND TRIM(w.word) <> '') AS total_unseen,
+           (SELECT COUNT(DISTINCT word_id) FROM question_attempts
+            WHERE session_id = :session_id) AS total_asked
+'''
+
+SQL_INSERT_ATTEMPT = '''
+    INSERT INTO question_attempts
+    (session_id, word_id, question_text, correct_answer, user_answer, is_correct, explanation, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_SET_ATTEMPT_EXPLANATION = '''
+    UPDATE question_attempts SET explanation = ?
+    WHERE id = (SELECT MAX(id) FROM question_attempts WHERE session_id = ? AND word_id = ?)
+'''
+
+SQL_UPDATE_SESSION_SCORE = '''
+    UPDATE sessions
+    SET correct_answers = correct_answers + :points, score = score + :points,
+        total_questions = total_questions + 1
+    WHERE id = :session_id
+'''
+
+# get_user_stats: daily and total stats in one pass over the user's
+# sessions, wrongbook count as a scalar subquery
+SQL_USER_STATS = '''
+    SELECT SUM(CASE WHEN session_date = :today THEN score END) as daily_score,
+           SUM(CASE WHEN session_date = :today THEN total_questions END) as daily_questions,
+           SUM(CASE WHEN session_date = :today THEN correct_answers END) as daily_correct,
+           SUM(score) as total_score, SUM(total_questions) as total_questions,
+           SUM(correct_answers) as total_correct,
+           (SELECT COUNT(*) FROM user_words
+            WHERE user_id = :user_id AND in_wrongbook = 1) as wrongbook_count
+    FROM sessions
+    WHERE user_id = :user_id
+'''
+
+# SRS & wrongbook update for one answer in a single statement.
+# A wrong answer inserts or resets the row; a correct answer only advances
+# an existing row (new words answered correctly are not tracked).
+# Values in DO UPDATE refer to the row as it was before the answer.
+# :now is the UTC answer time (see _utc_now_ts), the same clock the
+# due-word queries compare against with datetime('now').
+# srs_next_index/srs_days are the Python SRS helpers (_register_sql_functions).
+SQL_UPSERT_USER_WORD = '''
+    INSERT INTO user_words
+    (user_id, word_id, correct_count, last_reviewed, next_review, srs_interval, in_wrongbook)
+    SELECT :user_id, :word_id, 0, :now, :now, 0, 1
+    WHERE NOT :is_correct
+       OR EXISTS (SELECT 1 FROM user_words WHERE user_id = :user_id AND word_id = :word_id)
+    ON CONFLICT(user_id, word_id) DO UPDATE SET
+        correct_count = CASE WHEN :is_correct THEN user_words.correct_count + 1 ELSE 0 END,
+        last_reviewed = excluded.last_reviewed,
+        next_review = datetime(:now, '+' || srs_days(srs_next_index(user_words.srs_interval, :is_correct)) || ' days'),
+        srs_interval = srs_next_index(user_words.srs_interval, :is_correct),
+        in_wrongbook = CASE WHEN :is_correct AND user_words.correct_count + 1 >= 3 THEN 0 ELSE 1 END
+'''
 
 def _to_sql_ts(dt):
     if not dt:
         return None
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+def _utc_now_ts():
+    """Current UTC time in SQLite's datetime('now') format"""
+    return _to_sql_ts(datetime.now(timezone.utc))
 
-def get_srs_intervals():
-    """Return SRS intervals in days"""
-    return [0, 1, 3, 7, 14]
 
 def _env_flag(name: str, default: bool = False) -> bool:
     v = os.getenv(name, "")
     return str(v).lower() in ("1", "true", "yes", "on") or (default and v == "")
 
-def get_max_questions_per_session() -> int:
-    """Get the maximum number of questions per session from environment variable"""
+def _max_questions_per_session_from_env() -> int:
+    """Read the maximum number of questions per session from environment variable"""
     try:
         return int(os.getenv('LEXIBOOST_MAX_QUESTIONS', '50'))
     except (ValueError, TypeError):
         return 50
 
-def calculate_next_review(current_interval_index, is_correct):
-    """Calculate next review date based on SRS"""
-    intervals = get_srs_intervals()
-    
-    if is_correct:
-        next_index = min(current_interval_index + 1, len(intervals) - 1)
-    else:
-        next_index = 0  # Reset to beginning if incorrect
-    
-    next_interval = intervals[next_index]
-    next_review = datetime.now() + timedelta(days=next_interval)
-    
-    return next_review, next_index
+# Environment-derived settings, resolved once at startup
+MAX_QUESTIONS_PER_SESSION = _max_questions_per_session_from_env()
+HOVER_ZH_ENABLED = _env_flag('LEXIBOOST_HOVER_ZH', default=False)
+
+# Fallback sentence templates, grouped by part of speech
+_TEMPLATES_COMMON = (
+    "My family likes to talk about '{w}'.",
+    "We learned about '{w}' in class today.",
+    "The teacher gave an example with '{w}'.",
+    "Many people use '{w}' every day.",
+    "I saw the word '{w}' in a book.",
+    "This question is about '{w}'.",
+    "Can you explain what '{w}' means?",
+    "People often discuss '{w}' in daily life.",
+)
+_TEMPLATES_VERB = (
+    "People often '{w}' after school.",
+    "They decided to '{w}' together.",
+    "Try to '{w}' carefully in this task.",
+    "Sometimes we need to '{w}' to solve problems.",
+)
+_TEMPLATES_ADJ = (
+    "It was a very '{w}' idea.",
+    "The story sounds quite '{w}'.",
+    "Her answer seems '{w}' to me.",
+    "That looks rather '{w}'.",
+)
+_TEMPLATES_ADV = (
+    "She spoke '{w}' to make everything clear.",
+    "Please work '{w}' to avoid mistakes.",
+    "They moved '{w}' through the hallway.",
+    "He answered '{w}' during the test.",
+)
+_TEMPLATES_NOUN = (
+    "Everyone was talking about '{w}'.",
+    "The museum had an exhibit about '{w}'.",
+    "I read an article on '{w}' yesterday.",
+    "We found more information about '{w}'.",
+)
+
+# POS tag -> templates, checked in priority order (verb, adj, adv, noun)
+_TEMPLATES_BY_POS = (
+    (frozenset({"v", "verb"}), _TEMPLATES_VERB),
+    (frozenset({"adj", "adjective"}), _TEMPLATES_ADJ),
+    (frozenset({"adv", "adverb"}), _TEMPLATES_ADV),
+    (frozenset({"n", "noun"}), _TEMPLATES_NOUN),
+)
 
 def generate_sentence_with_word(word: str, pos_tags=None) -> str:
     """
     Lightweight fallback sentence generator when no DB example exists.
-    - Deterministic per word (seeded) to keep UX stable across sessions.
+    - Deterministic per word (CRC32-indexed) to keep UX stable across sessions,
+      restarts and worker processes.
     - Puts the word in quotes to avoid article/inflection issues (e.g., 'a').
     """
-    templates_common = [
-        "My family likes to talk about '{w}'.",
-        "We learned about '{w}' in class today.",
-        "The teacher gave an example with '{w}'.",
-        "Many people use '{w}' every day.",
-        "I saw the word '{w}' in a book.",
-        "This question is about '{w}'.",
-        "Can you explain what '{w}' means?",
-        "People often discuss '{w}' in daily life.",
-    ]
-
-    noun_like = {"n", "noun"}
-    verb_like = {"v", "verb"}
-    adj_like  = {"adj", "adjective"}
-    adv_like  = {"adv", "adverb"}
-
-    pos_tags = set((pos_tags or []))
-    if pos_tags & verb_like:
-        templates = [
-            "People often '{w}' after school.",
-            "They decided to '{w}' together.",
-            "Try to '{w}' carefully in this task.",
-            "Sometimes we need to '{w}' to solve problems.",
-        ]
-    elif pos_tags & adj_like:
-        templates = [
-            "It was a very '{w}' idea.",
-            "The story sounds quite '{w}'.",
-            "Her answer seems '{w}' to me.",
-            "That looks rather '{w}'.",
-        ]
-    elif pos_tags & adv_like:
-        templates = [
-            "She spoke '{w}' to make everything clear.",
-            "Please work '{w}' to avoid mistakes.",
-            "They moved '{w}' through the hallway.",
-            "He answered '{w}' during the test.",
-        ]
-    elif pos_tags & noun_like:
-        templates = [
-            "Everyone was talking about '{w}'.",
-            "The museum had an exhibit about '{w}'.",
-            "I read an article on '{w}' yesterday.",
-            "We found more information about '{w}'.",
-        ]
-    else:
-        templates = templates_common
+    templates = _TEMPLATES_COMMON
+    if pos_tags:
+        for tags, pos_templates in _TEMPLATES_BY_POS:
+            if not tags.isdisjoint(pos_tags):
+                templates = pos_templates
+                break
+
+    return templates[zlib.crc32(word.encode('utf-8')) % len(templates)].format(w=word)
+
+# Known outputs of generate_sentence_with_word, checked by /api/self-test;
+# they must not change across restarts or worker processes
+_SENTENCE_GENERATION_CASES = (
+    ('test', None, "I saw the word 'test' in a book."),
+    ('apple', None, "My family likes to talk about 'apple'."),
+    ('run', ['verb'], "People often 'run' after school."),
+)
+
+# (current step, correct?) -> (next step, next_review from 2024-01-31 12:00:00),
+# checked by /api/self-test through the SQL functions the answer upsert uses
+_SRS_CALCULATION_CASES = (
+    (0, True, (1, '2024-02-01 12:00:00')),
+    (1, True, (2, '2024-02-03 12:00:00')),
+    (2, True, (3, '2024-02-07 12:00:00')),
+    (4, True, (4, '2024-02-14 12:00:00')),
+    (3, False, (0, '2024-01-31 12:00:00')),
+)
+
+# SQLite allows one writer at a time; writers queue on this lock before
+# taking a connection, so a waiting writer never holds a pooled
+# connection or spins on "database is locked"
+_db_write_lock = threading.Lock()
+
+# Background answer writer
+# submit_answer responds as soon as the answer is graded; the attempt,
+# score and SRS writes are applied in order by a single writer thread.
+# Reads that depend on them wait for the user's pending writes first.
+_answer_queue = queue.Queue()
+_pending_answer_writes = {}  # user_id -> queued writes not yet committed
+_pending_answer_cond = threading.Condition()
+
+def _record_answer(session_id, user_id, word_id, question_text,
+                   correct_answer, user_answer, is_correct, explanation_en, answered_at):
+    """Write one answered question in a single transaction"""
+    with _db_write_lock, db_pool.connection() as conn:
+        # Take the write lock up front; the pool rolls back if anything fails
+        conn.execute('BEGIN IMMEDIATE')
+
+        # record attempt
+        conn.execute(SQL_INSERT_ATTEMPT, (session_id, word_id, question_text, correct_answer, user_answer, is_correct, explanation_en, answered_at))
+
+        # score
+        conn.execute(SQL_UPDATE_SESSION_SCORE, {'session_id': session_id, 'points': 1 if is_correct else 0})
+
+        # SRS & wrongbook
+        conn.execute(SQL_UPSERT_USER_WORD, {
+            'user_id': user_id,
+            'word_id': word_id,
+            'is_correct': is_correct,
+            'now': answered_at,
+        })
+
+        conn.commit()
 
-    rng = random.Random(hash(word) & 0xFFFFFFFF)
-    return rng.choice(templates).format(w=word)
+def _record_explanation(session_id, word_id, explanation_en):
+    """Fill in the explanation of the latest attempt at a word in a session"""
+    with _db_write_lock, db_pool.connection() as conn:
+        conn.execute(SQL_SET_ATTEMPT_EXPLANATION, (explanation_en, session_id, word_id))
+        conn.commit()
+
+# Lock contention is retried; writes that still fail are counted so
+# /api/self-test reports them rather than the answers vanishing silently
+ANSWER_WRITE_ATTEMPTS = 3
+_answer_write_failures = {'count': 0, 'last_error': None}
+
+def _is_transient_db_error(e):
+    """Busy/locked database or an exhausted pool; worth another try"""
+    if isinstance(e, TimeoutError):
+        return True
+    return isinstance(e, sqlite3.OperationalError) and ('locked' in str(e) or 'busy' in str(e))
+
+def _answer_writer_worker():
+    """Drain the answer queue, one transaction per write"""
+    while True:
+        user_id, write, args = _answer_queue.get()
+        try:
+            for attempt in range(1, ANSWER_WRITE_ATTEMPTS + 1):
+                try:
+                    write(*args)
+                    break
+                except Exception as e:
+                    if attempt == ANSWER_WRITE_ATTEMPTS or not _is_transient_db_error(e):
+                        raise
+                    app.logger.warning(f"Retrying {write.__name__} for user {user_id} ({attempt}/{ANSWER_WRITE_ATTEMPTS}): {e}")
+                    time.sleep(0.1 * attempt)
+        except Exception as e:
+            # Only this thread updates the counters
+            _answer_write_failures['count'] += 1
+            _answer_write_failures['last_error'] = f"{write.__name__} for user {user_id}: {e}"
+            app.logger.error(f"Failed to record answer for user {user_id}, lost write {write.__name__}{args!r}: {e}")
+        finally:
+            with _pending_answer_cond:
+                remaining = _pending_answer_writes.get(user_id, 1) - 1
+                if remaining:
+                    _pending_answer_writes[user_id] = remaining
+                else:
+                    _pending_answer_writes.pop(user_id, None)
+                _pending_answer_cond.notify_all()
+            _answer_queue.task_done()
+
+def _enqueue_answer_write(user_id, write, args):
+    with _pending_answer_cond:
+        _pending_answer_writes[user_id] = _pending_answer_writes.get(user_id, 0) + 1
+    _answer_queue.put((user_id, write, args))
+
+def wait_for_answer_writes(user_id):
+    """Block until every queued answer of this user is committed"""
+    with _pending_answer_cond:
+        _pending_answer_cond.wait_for(lambda: user_id not in _pending_answer_writes)
+
+_answer_writer_thread = threading.Thread(
+    target=_answer_writer_worker,
+    name="AnswerWriterThread",
+    daemon=True
+)
+_answer_writer_thread.start()
+
+# Sessions never change owner, so the user behind a session id is kept
+# in memory; oldest entries are dropped first once the map is full
+SESSION_USER_CACHE_SIZE = 4096
+_session_users = {}  # session_id -> user_id
+_session_users_lock = threading.Lock()
+
+def _remember_session_user(session_id, user_id):
+    with _session_users_lock:
+        if session_id not in _session_users and len(_session_users) >= SESSION_USER_CACHE_SIZE:
+            _session_users.pop(next(iter(_session_users)))
+        _session_users[session_id] = user_id
+
+# Explanations missing from the preload caches are fetched off the request
+# thread; submit_answer answers with the correct definition meanwhile
+_explanation_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=4,
+    thread_name_prefix="ExplanationThread"
+)
+
+def _fetch_explanation(session_id, user_id, word_id, word_txt, level):
+    """Generate an explanation and queue it for the recorded attempt"""
+    try:
+        explanation_en = definition_service.get_word_explanation(word_txt, level)['definition_en']
+    except Exception as e:
+        app.logger.error(f"Failed to fetch explanation for word {word_id}: {e}")
+        return
+    _enqueue_answer_write(user_id, _record_explanation, (session_id, word_id, explanation_en))
 
 @app.route('/')
 def index():
@@ -134,23 +437,20 @@ def create_user():
     if not username:
         return jsonify({'error': 'Username is required'}), 400
     
-    conn = get_db_connection()
-    try:
-        cursor = conn.execute('INSERT INTO users (username) VALUES (?)', (username,))
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return jsonify({'user_id': user_id, 'username': username})
-    except sqlite3.IntegrityError:
-        conn.close()
-        return jsonify({'error': 'Username already exists'}), 400
+    with _db_write_lock, db_pool.connection() as conn:
+        try:
+            cursor = conn.execute('INSERT INTO users (username) VALUES (?)', (username,))
+            user_id = cursor.lastrowid
+            conn.commit()
+            return jsonify({'user_id': user_id, 'username': username})
+        except sqlite3.IntegrityError:
+            return jsonify({'error': 'Username already exists'}), 400
 
 @app.route('/api/users/<username>')
 def get_user(username):
     """Get user by username"""
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-    conn.close()
+    with db_pool.connection() as conn:
+        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
     
     if user:
         return jsonify({
@@ -164,17 +464,16 @@ def get_user(username):
 @app.route('/api/users/<int:user_id>/session/start', methods=['POST'])
 def start_session(user_id):
     """Start a new quiz session with preloader"""
-    conn = get_db_connection()
-    
     # Create new session
-    session_date = datetime.now().date()
-    cursor = conn.execute(
-        'INSERT INTO sessions (user_id, session_date) VALUES (?, ?)',
-        (user_id, session_date)
-    )
-    session_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    session_date = datetime.now().date().isoformat()
+    with _db_write_lock, db_pool.connection() as conn:
+        cursor = conn.execute(
+            'INSERT INTO sessions (user_id, session_date) VALUES (?, ?)',
+            (user_id, session_date)
+        )
+        session_id = cursor.lastrowid
+        conn.commit()
+    _remember_session_user(session_id, user_id)
     
     # Start question preloader for this session
     question_preloader.start_session_preloader(session_id, user_id)
@@ -184,127 +483,89 @@ def start_session(user_id):
 @app.route('/api/sessions/<int:session_id>/question')
 def get_question(session_id):
     """Get next question from preloaded queue or fallback to real-time generation."""
-    conn = get_db_connection()
-
-    # 1) validate session
-    session = conn.execute('SELECT * FROM sessions WHERE id = ?', (session_id,)).fetchone()
-    if not session:
-        conn.close()
-        return jsonify({'error': 'Session not found'}), 404
-    user_id = session['user_id']
-
-    # 2) stop at max questions per session
-    max_questions_per_session = get_max_questions_per_session()
-    question_count = conn.execute(
-        'SELECT COUNT(*) as count FROM question_attempts WHERE session_id = ?',
-        (session_id,)
-    ).fetchone()['count']
-    if question_count >= max_questions_per_session:
-        conn.close()
-        return jsonify({'session_complete': True})
-
-    # 3) Try to get preloaded question first
-    preloaded_question = question_preloader.get_next_question(session_id)
-    if preloaded_question:
-        conn.close()
-        return jsonify({
-            'question_id': f"{session_id}_{preloaded_question.word_id}",
-            'word_id': preloaded_question.word_id,
-            'question_number': question_count + 1,
-            'target_word': preloaded_question.target_word,
-            'target_word_zh': preloaded_question.target_word_zh,
-            'sentence': preloaded_question.sentence,
-            'choices_i18n': preloaded_question.choices_i18n,
-            'correct_answer_i18n': preloaded_question.correct_answer_i18n,
-            'question_text': f'What does "{preloaded_question.target_word}" mean?',
-            'source': 'preloaded'  # For debugging
-        })
-
-    # 4) Fallback to original real-time generation if queue is empty
-    # Get words already asked in this session to avoid repetition
-    asked_word_ids = set()
-    asked_words = conn.execute('''
-        SELECT DISTINCT word_id FROM question_attempts 
-        WHERE session_id = ?
-    ''', (session_id,)).fetchall()
-    asked_word_ids = {row['word_id'] for row in asked_words}
-
-    # Candidate words: due wrongbook first, then unseen (exclude already asked)
-    wrongbook_words = conn.execute('''
-        SELECT w.*, uw.next_review, uw.srs_interval 
-        FROM words w 
-        JOIN user_words uw ON w.id = uw.word_id 
-        WHERE uw.user_id = ? AND uw.in_wrongbook = 1 
-          AND (uw.next_review IS NULL OR uw.next_review <= datetime('now'))
-          AND TRIM(w.word) <> ''
-        ORDER BY uw.next_review ASC
-        LIMIT 50
-    ''', (user_id,)).fetchall()
-    
-    # Filter out already asked words
-    wrongbook_words = [w for w in wrongbook_words if w['id'] not in asked_word_ids]
-
-    unseen_words = conn.execute('''
-        SELECT w.* FROM words w
-        WHERE TRIM(w.word) <> ''
-          AND w.id NOT IN (SELECT uw.word_id FROM user_words uw WHERE uw.user_id = ?)
-        ORDER BY RANDOM()
-        LIMIT 50
-    ''', (user_id,)).fetchall()
-    
-    # Filter out already asked words
-    unseen_words = [w for w in unseen_words if w['id'] not in asked_word_ids]
-
-    # Select target word for fallback generation
-    candidates = list(wrongbook_words) + list(unseen_words)
-    
-    # Check if we have any valid candidates
-    if not candidates:
-        # Check if it's because all words have been exhausted in this session
-        total_wrongbook = conn.execute('''
-            SELECT COUNT(*) as count FROM user_words uw
-            JOIN words w ON w.id = uw.word_id
-            WHERE uw.user_id = ? AND uw.in_wrongbook = 1 
-              AND (uw.next_review IS NULL OR uw.next_review <= datetime('now'))
-              AND TRIM(w.word) <> ''
-        ''', (user_id,)).fetchone()['count']
-        
-        total_unseen = conn.execute('''
-            SELECT COUNT(*) as count FROM words w
-            WHERE TRIM(w.word) <> ''
-              AND w.id NOT IN (SELECT uw.word_id FROM user_words uw WHERE uw.user_id = ?)
-        ''', (user_id,)).fetchone()['count']
-        
-        total_available = total_wrongbook + total_unseen
-        
-        conn.close()
-        
-        if total_available == 0:
-            return jsonify({
-                'session_complete': True,
-                'message': 'No words available in the database. Please import vocabulary data.',
-                'reason': 'no_words_in_db'
-            })
-        elif len(asked_word_ids) >= total_available:
-            return jsonify({
-                'session_complete': True,
-                'message': f'Congratulations! You have completed all {len(asked_word_ids)} available words in this session.',
-                'reason': 'all_words_completed'
-            })
-        else:
+    # 1) validate session. The answer writer needs a pooled connection to
+    # drain this user's queued answers, so wait for them without holding one
+    user_id = _session_users.get(session_id)
+    if user_id is None:
+        with db_pool.connection() as conn:
+            session = conn.execute(SQL_GET_SESSION, (session_id,)).fetchone()
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+        user_id = session['user_id']
+        _remember_session_user(session_id, user_id)
+    wait_for_answer_writes(user_id)
+
+    with db_pool.connection() as conn:
+        # Counters include every answer recorded so far
+        session = conn.execute(SQL_GET_SESSION, (session_id,)).fetchone()
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+
+        # 2) stop at max questions per session (total_questions is bumped
+        # with every recorded attempt, so no COUNT over question_attempts)
+        question_count = session['total_questions']
+        if question_count >= MAX_QUESTIONS_PER_SESSION:
+            return jsonify({'session_complete': True})
+
+        # 3) Try to get preloaded question first
+        preloaded_question = question_preloader.get_next_question(session_id)
+        if preloaded_question:
             return jsonify({
-                'session_complete': True,
-                'message': 'No more words due for review at this time. Great job!',
-                'reason': 'no_words_due'
+                'question_id': f"{session_id}_{preloaded_question.word_id}",
+                'word_id': preloaded_question.word_id,
+                'question_number': question_count + 1,
+                'target_word': preloaded_question.target_word,
+                'target_word_zh': preloaded_question.target_word_zh,
+                'sentence': preloaded_question.sentence,
+                'choices_i18n': preloaded_question.choices_i18n,
+                'correct_answer_i18n': preloaded_question.correct_answer_i18n,
+                'question_text': f'What does "{preloaded_question.target_word}" mean?',
+                'source': 'preloaded'  # For debugging
             })
 
+        # 4) Fallback to original real-time generation if queue is empty
+        # (see SQL_FALLBACK_CANDIDATES)
+        # Wrongbook rows come first, then unseen rows
+        candidates = conn.execute(
+            SQL_FALLBACK_CANDIDATES,
+            {'session_id': session_id, 'user_id': user_id, 'seed': random.getrandbits(62)}
+        ).fetchall()
+        
+        # Check if we have any valid candidates
+        if not candidates:
+            # Check if it's because all words have been exhausted in this session
+            counts = conn.execute(
+                SQL_FALLBACK_EMPTY_COUNTS,
+                {'session_id': session_id, 'user_id': user_id}
+            ).fetchone()
+            total_available = counts['total_wrongbook'] + counts['total_unseen']
+            asked_count = counts['total_asked']
+            
+            if total_available == 0:
+                return jsonify({
+                    'session_complete': True,
+                    'message': 'No words available in the database. Please import vocabulary data.',
+                    'reason': 'no_words_in_db'
+                })
+            elif asked_count >= total_available:
+                return jsonify({
+                    'session_complete': True,
+                    'message': f'Congratulations! You have completed all {asked_count} available words in this session.',
+                    'reason': 'all_words_completed'
+                })
+            else:
+                return jsonify({
+                    'session_complete': True,
+                    'message': 'No more words due for review at this time. Great job!',
+                    'reason': 'no_words_due'
+                })
+
     target = random.choice(candidates)
     word_id = target['id']
     word_txt = (target['word'] or '').strip()
     level = (target['level'] or 'k12').strip() if 'level' in target.keys() else 'k12'
     
     if not word_txt:
-        conn.close()
         return jsonify({'error': 'Invalid word selected.'}), 400
 
     # Get real-time explanation from LLM (fallback mode)
@@ -316,7 +577,6 @@ def get_question(session_id):
         distractors_zh = explanation['distractors_zh']
         examples = explanation.get('examples', [])
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Failed to generate explanation: {str(e)}'}), 500
 
     # 6) generate sentence (use example if available, otherwise fallback)
@@ -325,29 +585,28 @@ def get_question(session_id):
     else:
         sentence = generate_sentence_with_word(word_txt)
 
-    # 7) build choices (i18n) using real-time distractors
+    # 7) build choices (i18n) using real-time distractors, placing each
+    # choice straight into a random permutation of the 4 slots
     correct_pair = {'en': correct_en, 'zh': correct_zh}
-    choices_i18n = [correct_pair]
+    slots = random.sample(range(4), 4)
+    choices_i18n = [None] * 4
+    choices_i18n[slots[0]] = correct_pair
 
     # Add distractors from LLM (limit to 3 to make total 4 choices)
-    for i in range(min(3, len(distractors_en), len(distractors_zh))):
-        choices_i18n.append({
+    n_distractors = min(3, len(distractors_en), len(distractors_zh))
+    for i in range(n_distractors):
+        choices_i18n[slots[i + 1]] = {
             'en': distractors_en[i],
             'zh': distractors_zh[i]
-        })
-    
+        }
+
     # Ensure we have exactly 4 choices total
-    while len(choices_i18n) < 4:
-        choices_i18n.append({
+    for slot in slots[n_distractors + 1:]:
+        choices_i18n[slot] = {
             'en': 'A general concept or idea',
             'zh': '一般概念或想法'
-        })
-    
-    random.shuffle(choices_i18n)
+        }
 
-    hover_zh_enabled = _env_flag('LEXIBOOST_HOVER_ZH', default=False)
-
-    conn.close()
     return jsonify({
         'question_id': f"{session_id}_{word_id}",
         'word_id': word_id,
@@ -358,7 +617,7 @@ def get_question(session_id):
         'choices_i18n': choices_i18n,
         'correct_answer_i18n': correct_pair,
         'question_number': question_count + 1,
-        'hover_zh_enabled': hover_zh_enabled,
+        'hover_zh_enabled': HOVER_ZH_ENABLED,
         'source': 'fallback'  # For debugging
     })
 
@@ -372,133 +631,75 @@ def submit_answer(session_id):
     question_text = data.get('question_text')
 
     is_correct = user_answer == correct_answer
-
-    conn = get_db_connection()
-
-    # session & user
-    session = conn.execute('SELECT * FROM sessions WHERE id = ?', (session_id,)).fetchone()
-    user_id = session['user_id']
-
-    # Try to get explanation from preloaded questions first
-    preloaded_explanation = question_preloader.get_explanation_for_word_id(word_id)
-    if preloaded_explanation:
-        explanation_en = preloaded_explanation['definition_en']
-        explanation_zh = preloaded_explanation['definition_zh']
+    # One timestamp for every row this answer writes, taken when it was
+    # given rather than when the writer thread gets to it
+    answered_at = _utc_now_ts()
+
+    # session & user; only looked up for sessions this process hasn't seen
+    user_id = _session_users.get(session_id)
+    if user_id is None:
+        with db_pool.connection() as conn:
+            session = conn.execute(SQL_GET_SESSION, (session_id,)).fetchone()
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+        user_id = session['user_id']
+        _remember_session_user(session_id, user_id)
+
+    # Try to get explanation from preloaded questions first, then the
+    # explanation cache; only a miss on both needs the LLM
+    explanation = question_preloader.get_explanation_for_word_id(word_id)
+    word = None
+    if not explanation:
+        with db_pool.connection() as conn:
+            word = conn.execute(SQL_GET_WORD, (word_id,)).fetchone()
+        if word:
+            explanation = question_preloader.get_cached_explanation(word['word'], word['level'] or 'k12')
+
+    if explanation:
+        explanation_en = explanation['definition_en']
+        explanation_zh = explanation['definition_zh']
     else:
-        # Fallback to real-time generation if not in preload cache
-        w = conn.execute('SELECT word, level FROM words WHERE id = ?', (word_id,)).fetchone()
-        if w:
-            word_txt = w['word']
-            level = w['level'] or 'k12'
-            try:
-                explanation = definition_service.get_word_explanation(word_txt, level)
-                explanation_en = explanation['definition_en']
-                explanation_zh = explanation['definition_zh']
-            except Exception:
-                explanation_en = correct_answer or ""
-                explanation_zh = ""
-        else:
-            explanation_en = correct_answer or ""
-            explanation_zh = ""
-
-    # record attempt
-    conn.execute('''
-        INSERT INTO question_attempts 
-        (session_id, word_id, question_text, correct_answer, user_answer, is_correct, explanation)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (session_id, word_id, question_text, correct_answer, user_answer, is_correct, explanation_en))
-
-    # score
-    if is_correct:
-        conn.execute(
-            'UPDATE sessions SET correct_answers = correct_answers + 1, score = score + 1 WHERE id = ?',
-            (session_id,)
+        explanation_en = correct_answer or ""
+        explanation_zh = ""
+
+    # Persist attempt, score and SRS progress on the writer thread
+    _enqueue_answer_write(user_id, _record_answer, (
+        session_id, user_id, word_id, question_text,
+        correct_answer, user_answer, is_correct, explanation_en, answered_at
+    ))
+
+    # Fetch a missing explanation in the background; it is stored on the
+    # attempt once ready instead of holding up this response
+    explanation_pending = not explanation and word is not None
+    if explanation_pending:
+        _explanation_executor.submit(
+            _fetch_explanation, session_id, user_id, word_id, word['word'], word['level'] or 'k12'
         )
-    conn.execute('UPDATE sessions SET total_questions = total_questions + 1 WHERE id = ?', (session_id,))
-
-    # SRS & wrongbook
-    user_word = conn.execute(
-        'SELECT * FROM user_words WHERE user_id = ? AND word_id = ?',
-        (user_id, word_id)
-    ).fetchone()
-
-    if user_word:
-        if is_correct:
-            new_correct_count = user_word['correct_count'] + 1
-            next_review, next_interval = calculate_next_review(user_word['srs_interval'], True)
-            in_wrongbook = 1 if new_correct_count < 3 else 0
-            conn.execute('''
-                UPDATE user_words 
-                SET correct_count = ?, last_reviewed = datetime('now'), 
-                    next_review = ?, srs_interval = ?, in_wrongbook = ?
-                WHERE id = ?
-            ''', (new_correct_count, next_review, next_interval, in_wrongbook, user_word['id']))
-        else:
-            next_review, next_interval = calculate_next_review(0, False)
-            conn.execute('''
-                UPDATE user_words 
-                SET correct_count = 0, last_reviewed = datetime('now'),
-                    next_review = ?, srs_interval = ?, in_wrongbook = 1
-                WHERE id = ?
-            ''', (next_review, next_interval, user_word['id']))
-    else:
-        if not is_correct:
-            next_review, next_interval = calculate_next_review(0, False)
-            conn.execute('''
-                INSERT INTO user_words 
-                (user_id, word_id, correct_count, last_reviewed, next_review, srs_interval, in_wrongbook)
-                VALUES (?, ?, 0, datetime('now'), ?, ?, 1)
-            ''', (user_id, word_id, next_review, next_interval))
-
-    conn.commit()
-    conn.close()
 
     return jsonify({
         'is_correct': is_correct,
         'explanation_en': explanation_en,
         'explanation_zh': explanation_zh,
+        'explanation_pending': explanation_pending,
         'score_change': 1 if is_correct else 0
     })
 
 @app.route('/api/users/<int:user_id>/stats')
 def get_user_stats(user_id):
     """Get user statistics"""
-    conn = get_db_connection()
-    
-    # Daily stats
-    today = datetime.now().date()
-    daily_stats = conn.execute('''
-        SELECT SUM(score) as daily_score, SUM(total_questions) as daily_questions,
-               SUM(correct_answers) as daily_correct
-        FROM sessions 
-        WHERE user_id = ? AND session_date = ?
-    ''', (user_id, today)).fetchone()
-    
-    # Total stats
-    total_stats = conn.execute('''
-        SELECT SUM(score) as total_score, SUM(total_questions) as total_questions,
-               SUM(correct_answers) as total_correct
-        FROM sessions 
-        WHERE user_id = ?
-    ''', (user_id,)).fetchone()
-    
-    # Wrongbook count
-    wrongbook_count = conn.execute('''
-        SELECT COUNT(*) as count 
-        FROM user_words 
-        WHERE user_id = ? AND in_wrongbook = 1
-    ''', (user_id,)).fetchone()
-    
-    conn.close()
-    
+    wait_for_answer_writes(user_id)
+    with db_pool.connection() as conn:
+        today = datetime.now().date().isoformat()
+        stats = conn.execute(SQL_USER_STATS, {'user_id': user_id, 'today': today}).fetchone()
+
     return jsonify({
-        'daily_score': daily_stats['daily_score'] or 0,
-        'daily_questions': daily_stats['daily_questions'] or 0,
-        'daily_correct': daily_stats['daily_correct'] or 0,
-        'total_score': total_stats['total_score'] or 0,
-        'total_questions': total_stats['total_questions'] or 0,
-        'total_correct': total_stats['total_correct'] or 0,
-        'wrongbook_count': wrongbook_count['count'] or 0
+        'daily_score': stats['daily_score'] or 0,
+        'daily_questions': stats['daily_questions'] or 0,
+        'daily_correct': stats['daily_correct'] or 0,
+        'total_score': stats['total_score'] or 0,
+        'total_questions': stats['total_questions'] or 0,
+        'total_correct': stats['total_correct'] or 0,
+        'wrongbook_count': stats['wrongbook_count'] or 0
     })
 
 @app.route('/api/users/<int:user_id>/wrongbook/import', methods=['POST'])
@@ -513,48 +714,46 @@ def import_wrongbook(user_id):
         return jsonify({'error': 'File must be CSV format'}), 400
 
     try:
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
+        # Decode the upload incrementally instead of reading it all at once;
+        # utf-8-sig drops the BOM spreadsheet exports put before the first word.
+        # A codecs reader only needs .read(): before Python 3.11 werkzeug's
+        # SpooledTemporaryFile lacks readable(), which TextIOWrapper requires
+        stream = codecs.getreader('utf-8-sig')(file.stream)
         csv_reader = csv.reader(stream)
 
-        conn = get_db_connection()
-        imported_count = 0
-
-        for row in csv_reader:
-            if len(row) >= 1:
-                word = (row[0] or '').strip()
-                if not word:
-                    continue
-
-                # find or create word (only store word and metadata)
-                existing = conn.execute(
-                    'SELECT id FROM words WHERE word = ?',
-                    (word,)
-                ).fetchone()
-                if existing:
-                    word_id = existing['id']
-                else:
-                    cursor = conn.execute(
-                        'INSERT INTO words (word) VALUES (?)',
-                        (word,)
-                    )
-                    word_id = cursor.lastrowid
-
-                # add to user's wrongbook if not exists
-                uw = conn.execute(
-                    'SELECT id FROM user_words WHERE user_id = ? AND word_id = ?',
-                    (user_id, word_id)
-                ).fetchone()
-                if not uw:
-                    next_review = datetime.now()
-                    conn.execute('''
-                        INSERT INTO user_words
-                        (user_id, word_id, correct_count, last_reviewed, next_review, srs_interval, in_wrongbook)
-                        VALUES (?, ?, 0, datetime('now'), ?, 0, 1)
-                    ''', (user_id, word_id, next_review))
-                    imported_count += 1
-
-        conn.commit()
-        conn.close()
+        def csv_words():
+            for row in csv_reader:
+                word = (row[0] or '').strip() if row else ''
+                if word:
+                    yield (word,)
+
+        with _db_write_lock, db_pool.connection() as conn:
+            # Stream distinct words (kept in file order) into a temp table,
+            # then add them with two set-based statements
+            conn.execute('BEGIN')
+            conn.execute('CREATE TEMP TABLE import_stage (pos INTEGER PRIMARY KEY, word TEXT UNIQUE)')
+            conn.executemany('INSERT OR IGNORE INTO temp.import_stage (word) VALUES (?)', csv_words())
+
+            # find or create words (only store word and metadata)
+            conn.execute('INSERT OR IGNORE INTO words (word) SELECT word FROM temp.import_stage ORDER BY pos')
+
+            # add to user's wrongbook if not exists; the conflict target
+            # makes a missing (user_id, word_id) unique index an error
+            # instead of silently duplicating progress rows
+            cursor = conn.execute('''
+                INSERT INTO user_words
+                (user_id, word_id, correct_count, last_reviewed, next_review, srs_interval, in_wrongbook)
+                SELECT :user_id, w.id, 0, :now, :now, 0, 1
+                FROM temp.import_stage s JOIN words w ON w.word = s.word
+                ORDER BY s.pos
+                ON CONFLICT(user_id, word_id) DO NOTHING
+            ''', {'user_id': user_id, 'now': _utc_now_ts()})
+            imported_count = cursor.rowcount
+
+            # Dropped inside the transaction: a failed import rolls the
+            # table back with everything else
+            conn.execute('DROP TABLE temp.import_stage')
+            conn.commit()
 
         return jsonify({
             'message': f'Successfully imported {imported_count} words',
@@ -567,52 +766,94 @@ def import_wrongbook(user_id):
 @app.route('/api/config')
 def get_config():
     """Get application configuration"""
-    return jsonify({
-        'max_questions_per_session': get_max_questions_per_session(),
-        'hover_zh_enabled': _env_flag('LEXIBOOST_HOVER_ZH', default=False)
+    response = jsonify({
+        'max_questions_per_session': MAX_QUESTIONS_PER_SESSION,
+        'hover_zh_enabled': HOVER_ZH_ENABLED
     })
+    # Settings are fixed for the life of the process: let browsers reuse
+    # the response and revalidate with If-None-Match (304) afterwards
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    response.add_etag()
+    return response.make_conditional(request)
+
+# Self-test results are reused for a short while so a monitoring probe
+# polling the endpoint does not rerun every check on each hit
+SELF_TEST_CACHE_SECONDS = 30
+_self_test_cache = {'expires': 0.0, 'result': None}
 
 @app.route('/api/self-test')
 def self_test():
     """Run self-tests to validate the application"""
+    now = time.monotonic()
+    if _self_test_cache['result'] is not None and now < _self_test_cache['expires']:
+        return jsonify(_self_test_cache['result'])
+
     tests = []
     
     try:
         # Test database connection
-        conn = get_db_connection()
-        conn.execute('SELECT 1').fetchone()
-        conn.close()
+        with db_pool.connection() as conn:
+            conn.execute('SELECT 1').fetchone()
         tests.append({'test': 'Database Connection', 'status': 'PASS'})
     except Exception as e:
         tests.append({'test': 'Database Connection', 'status': 'FAIL', 'error': str(e)})
     
     try:
-        # Test word generation
-        test_word = 'test'
-        sentence = generate_sentence_with_word(test_word)
-        if test_word in sentence:
-            tests.append({'test': 'Sentence Generation', 'status': 'PASS'})
+        # Test word generation against fixed sentences, so a pick that
+        # changes between processes (e.g. salted hash()) fails here
+        for test_word, pos_tags, expected in _SENTENCE_GENERATION_CASES:
+            sentence = generate_sentence_with_word(test_word, pos_tags)
+            if test_word not in sentence:
+                tests.append({'test': 'Sentence Generation', 'status': 'FAIL', 'error': 'Word not in sentence'})
+                break
+            if sentence != expected:
+                tests.append({'test': 'Sentence Generation', 'status': 'FAIL', 'error': f'Unstable sentence for {test_word!r}: {sentence!r}'})
+                break
         else:
-            tests.append({'test': 'Sentence Generation', 'status': 'FAIL', 'error': 'Word not in sentence'})
+            tests.append({'test': 'Sentence Generation', 'status': 'PASS'})
     except Exception as e:
         tests.append({'test': 'Sentence Generation', 'status': 'FAIL', 'error': str(e)})
     
+    # Answers acknowledged to clients but never stored
+    failed_writes = _answer_write_failures['count']
+    if failed_writes:
+        tests.append({
+            'test': 'Answer Writes',
+            'status': 'FAIL',
+            'error': f"{failed_writes} answer writes failed since startup; last: {_answer_write_failures['last_error']}"
+        })
+    else:
+        tests.append({'test': 'Answer Writes', 'status': 'PASS'})
+
     try:
-        # Test SRS calculation
-        next_review, interval = calculate_next_review(0, True)
-        if isinstance(next_review, datetime) and interval >= 0:
-            tests.append({'test': 'SRS Calculation', 'status': 'PASS'})
-        else:
-            tests.append({'test': 'SRS Calculation', 'status': 'FAIL', 'error': 'Invalid SRS result'})
+        # Test SRS calculation the way SQL_UPSERT_USER_WORD does it: the
+        # registered SQL functions on a pooled connection, from a UTC :now
+        with db_pool.connection() as conn:
+            for current_index, is_correct, expected in _SRS_CALCULATION_CASES:
+                got = tuple(conn.execute(
+                    "SELECT srs_next_index(:index, :is_correct),"
+                    " datetime(:now, '+' || srs_days(srs_next_index(:index, :is_correct)) || ' days')",
+                    {'index': current_index, 'is_correct': is_correct, 'now': '2024-01-31 12:00:00'}
+                ).fetchone())
+                if got != expected:
+                    tests.append({'test': 'SRS Calculation', 'status': 'FAIL',
+                                  'error': f'Step from {current_index} (correct={is_correct}) gave {got}, expected {expected}'})
+                    break
+            else:
+                tests.append({'test': 'SRS Calculation', 'status': 'PASS'})
     except Exception as e:
         tests.append({'test': 'SRS Calculation', 'status': 'FAIL', 'error': str(e)})
     
     all_passed = all(test['status'] == 'PASS' for test in tests)
     
-    return jsonify({
+    result = {
         'overall_status': 'PASS' if all_passed else 'FAIL',
         'tests': tests
-    })
+    }
+    _self_test_cache['result'] = result
+    _self_test_cache['expires'] = now + SELF_TEST_CACHE_SECONDS
+    return jsonify(result)
 
 @app.route('/api/sessions/<int:session_id>/stop', methods=['POST'])
 def stop_session(session_id):
@@ -631,8 +872,15 @@ def cleanup_preloaders():
     print("Cleaning up preloader threads...")
     for session_id in list(question_preloader.preload_threads.keys()):
         question_preloader.stop_session_preloader(session_id)
+    question_preloader.db_pool.close_all()
     print("Cleanup completed.")
 
+def cleanup_db_pool():
+    """Flush queued answer writes and close pooled database connections on app exit"""
+    _explanation_executor.shutdown(wait=True)
+    _answer_queue.join()
+    db_pool.close_all()
+
 def signal_handler(signum, frame):
     """Handle termination signals for graceful shutdown"""
     print(f"\nReceived signal {signum}. Shutting down gracefully...")
@@ -640,6 +888,7 @@ def signal_handler(signum, frame):
     exit(0)
 
 # Register cleanup function and signal handlers
+atexit.register(cleanup_db_pool)
 atexit.register(cleanup_preloaders)
 signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
@@ -650,8 +899,21 @@ if __name__ == '__main__':
         debug_mode = os.environ.get('LEXIBOOST_ENV', 'development').lower() == 'development'
         port = int(os.environ.get('LEXIBOOST_PORT', '5000'))
         
-        print(f"Starting LexiBoost server on port {port} (debug={debug_mode})")
-        app.run(debug=debug_mode, host='0.0.0.0', port=port)
+        threads = int(os.environ.get('LEXIBOOST_THREADS', '16'))
+
+        if debug_mode:
+            print(f"Starting LexiBoost server on port {port} (debug={debug_mode})")
+            app.run(debug=debug_mode, host='0.0.0.0', port=port)
+        else:
+            try:
+                from waitress import serve
+            except ImportError:
+                print("waitress not installed, falling back to the threaded development server")
+                print(f"Starting LexiBoost server on port {port} (debug={debug_mode})")
+                app.run(debug=False, host='0.0.0.0', port=port, threaded=True)
+            else:
+                print(f"Starting LexiBoost server on port {port} with waitress ({threads} threads)")
+                serve(app, host='0.0.0.0', port=port, threads=threads)
     except KeyboardInterrupt:
         print("\nReceived KeyboardInterrupt. Shutting down gracefully...")
         cleanup_preloaders()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+SQLite Connection Pool for LexiBoost
+Keeps a bounded set of configured connections open across requests
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+class ConnectionPool:
+    """Thread-safe pool of reusable SQLite connections"""
+
+    def __init__(self, db_path: str = "lexiboost.db", size: int = 8,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout  # seconds to wait for a free connection
+        self.on_connect = on_connect  # extra per-connection setup, e.g. SQL functions
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a connection and apply per-connection settings once"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers run while a writer commits; journal_mode is
+        # persistent in the file, the rest are per-connection settings
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-20000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=268435456')
+        # Wait for a competing writer instead of failing with "database is locked"
+        conn.execute('PRAGMA busy_timeout=30000')
+        if self.on_connect:
+            self.on_connect(conn)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Connections are opened lazily, up to the pool size
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Fail instead of hanging forever if every connection stays checked out
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No free database connection after {self.timeout}s (pool size {self.size})"
+            ) from None
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the duration of the block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close_all(self) -> None:
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -5,6 +5,7 @@ Uses the explainer module to generate definitions and distractors in real-time
 """
 
 import os
+import threading
 from typing import Dict, Optional
 
 class DefinitionService:
@@ -13,6 +14,10 @@ class DefinitionService:
     def __init__(self):
         self.default_level = os.getenv("LEXIBOOST_DEFAULT_LEVEL", "k12")
         self.mock_mode = os.getenv("LEXIBOOST_MOCK_DEFINITIONS", "true").lower() == "true"
+        # (word, level) -> lock held while that explanation is being generated,
+        # so concurrent cache misses wait for one LLM call instead of each making their own
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
     
     def get_word_explanation(self, word: str, level: Optional[str] = None) -> Dict:
         """
@@ -36,17 +41,38 @@ class DefinitionService:
             level = self.default_level
         
         # First try to get from preloader cache
-        try:
-            from question_preloader import question_preloader
-            cached_explanation = question_preloader.get_cached_explanation(word, level)
-            if cached_explanation:
-                return cached_explanation
-        except Exception:
-            pass  # If preloader not available, continue with normal flow
+        cached_explanation = self._get_cached(word, level)
+        if cached_explanation:
+            return cached_explanation
             
         if self.mock_mode:
             return self._mock_explanation(word, level)
-            
+
+        key = (word.lower(), level)
+        with self._inflight_lock:
+            inflight = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with inflight:
+                # Another request may have generated it while we waited
+                cached_explanation = self._get_cached(word, level)
+                if cached_explanation:
+                    return cached_explanation
+                return self._generate_explanation(word, level)
+        finally:
+            with self._inflight_lock:
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+
+    def _get_cached(self, word: str, level: str) -> Optional[Dict]:
+        """Look up an explanation in the preloader's LRU cache"""
+        try:
+            from question_preloader import question_preloader
+            return question_preloader.get_cached_explanation(word, level)
+        except Exception:
+            return None  # If preloader not available, continue with normal flow
+
+    def _generate_explanation(self, word: str, level: str) -> Dict:
+        """Call the LLM explainer and cache the result"""
         try:
             from data.explainer import explain_word
             explanation = explain_word(word, level=level) 
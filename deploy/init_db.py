@@ -7,6 +7,7 @@ import ast
 import sqlite3
 import json
 import csv
+import itertools
 import random
 from typing import List, Dict, Any, Tuple, Optional
 import os
@@ -17,11 +18,17 @@ INITIAL_CSV = os.getenv(
     "LEXIBOOST_INITIAL_CSV",
     "data/explained/b1_words_with_topics_explained.csv",
 ).strip()
+# Rows per transaction when seeding; keeps the journal small on large word lists
+COMMIT_EVERY = 1000
 
 def get_db_connection():
     """Get database connection"""
     conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
+    # Per-connection settings, matching the app's pooled connections
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA busy_timeout=30000")
     return conn
 
 def init_db():
@@ -29,6 +36,10 @@ def init_db():
     conn = get_db_connection()
     cur = conn.cursor()
 
+    # WAL is stored in the database file, so the schema, the seed and the
+    # app's pooled connections all share it from the first write on
+    cur.execute("PRAGMA journal_mode=WAL")
+
     # users
     cur.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -94,11 +105,29 @@ def init_db():
 
     # Indexes (only for remaining tables)
     cur.execute("CREATE INDEX IF NOT EXISTS idx_words_word ON words(word)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_words_user_id ON user_words(user_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_words_word_id ON user_words(word_id)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)")
+    # One progress row per (user, word); the wrongbook import and the answer
+    # writer UPSERT use it as their ON CONFLICT(user_id, word_id) target.
+    # Databases created before this index may hold duplicates: keep the
+    # oldest row, the one the app always read.
+    cur.execute("""
+    DELETE FROM user_words
+    WHERE id NOT IN (SELECT MIN(id) FROM user_words GROUP BY user_id, word_id)
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_user_words_user_word ON user_words(user_id, word_id)")
+
+    # Composite indexes for the hot lookups:
+    #   due wrongbook words per user (get_question)
+    #   words already asked in a session (get_question)
+    #   daily stats per user (get_user_stats)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_userwords_user_wb_nr ON user_words(user_id, in_wrongbook, next_review)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_qa_session_word ON question_attempts(session_id, word_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_date ON sessions(user_id, session_date)")
 
     conn.commit()
+
+    # Refresh planner statistics so the new indexes are picked up
+    cur.execute("ANALYZE")
     conn.close()
 
 def seed_from_csv(csv_path: str = INITIAL_CSV) -> None:
@@ -123,8 +152,6 @@ def seed_from_csv(csv_path: str = INITIAL_CSV) -> None:
     conn = get_db_connection()
     cur = conn.cursor()
 
-    inserted, updated = 0, 0
-
     with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(_line_iter(f))
         need = {"word"}
@@ -132,52 +159,54 @@ def seed_from_csv(csv_path: str = INITIAL_CSV) -> None:
         if miss:
             raise ValueError(f"CSV missing columns: {miss}; got {reader.fieldnames}")
 
-        for row in reader:
-            word = (row.get("word") or "").strip()
-            if not word:
-                continue
-
-            category = (row.get("category") or "").strip()
-            level = (row.get("level") or "k12").strip()
-
-            # upsert words (only word and metadata)
-            cur.execute("SELECT id FROM words WHERE word = ? LIMIT 1", (word,))
-            row0 = cur.fetchone()
-            if row0:
-                word_id = row0["id"]
-                cur.execute("""
-                    UPDATE words
-                       SET category = ?,
-                           level = ?
-                     WHERE id = ?
-                """, (category, level, word_id))
-                updated += 1
-            else:
-                cursor = cur.execute("""
-                    INSERT INTO words (word, category, level)
-                    VALUES (?, ?, ?)
-                """, (word, category, level))
-                word_id = cursor.lastrowid
-                inserted += 1
+        def _rows():
+            for row in reader:
+                word = (row.get("word") or "").strip()
+                if not word:
+                    continue
+                category = (row.get("category") or "").strip()
+                level = (row.get("level") or "k12").strip()
+                yield word, category, level
+
+        # One upsert statement per chunk instead of SELECT + INSERT/UPDATE per row;
+        # committed chunks survive a crash and are simply upserted again on re-run
+        before = cur.execute("SELECT COUNT(*) FROM words").fetchone()[0]
+        rows = _rows()
+        total = 0
+        while True:
+            chunk = list(itertools.islice(rows, COMMIT_EVERY))
+            if not chunk:
+                break
+            cur.executemany("""
+                INSERT INTO words (word, category, level)
+                VALUES (?, ?, ?)
+                ON CONFLICT(word) DO UPDATE SET
+                    category = excluded.category,
+                    level = excluded.level
+            """, chunk)
+            total += cur.rowcount
+            conn.commit()
+        inserted = cur.execute("SELECT COUNT(*) FROM words").fetchone()[0] - before
+        updated = total - inserted
 
-    conn.commit()
     conn.close()
     print(f"[INFO] CSV import done: inserted={inserted}, updated={updated}, file={csv_path}")
 
-# Mock LLM sentence generation
+# Mock LLM sentence generation; only the chosen template gets formatted
+_SENTENCE_TEMPLATES = (
+    "The {w} is very important in our daily life.",
+    "I saw a beautiful {w} in the garden today.",
+    "My teacher told us about the {w} in class.",
+    "The children were excited to see the {w}.",
+    "We learned about {w} in our science lesson.",
+    "The {w} made everyone smile and laugh happily.",
+    "During summer vacation, we often see this {w}.",
+    "My family likes to talk about the {w}."
+)
+
 def generate_sentence_with_word(word):
     """Generate a simple sentence containing the target word"""
-    templates = [
-        f"The {word} is very important in our daily life.",
-        f"I saw a beautiful {word} in the garden today.",
-        f"My teacher told us about the {word} in class.",
-        f"The children were excited to see the {word}.",
-        f"We learned about {word} in our science lesson.",
-        f"The {word} made everyone smile and laugh happily.",
-        f"During summer vacation, we often see this {word}.",
-        f"My family likes to talk about the {word}."
-    ]
-    return random.choice(templates)
+    return random.choice(_SENTENCE_TEMPLATES).format(w=word)
 
 
 if __name__ == '__main__':
@@ -7,22 +7,104 @@ Implements a memory-based queue system with background thread for LLM calls
 import os
 import time
 import random
-import sqlite3
 import threading
 from collections import deque, OrderedDict
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 import logging
 
+from connection_pool import ConnectionPool
 from definition_service import definition_service
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Unseen-word sampling, shared with the fallback path in app.py: up to 50
+# non-blank words the user has no progress row for and that were not
+# already asked in :session_id. Words are read in id order from a random
+# pivot (wrapping around) rather than sorting the whole words table by
+# RANDOM(). Defines the CTEs pivot, un_hi, un_lo and un; parameters
+# :user_id, :session_id and :seed.
+SQL_UNSEEN_WORD_CTES = '''
+    pivot AS (
+        SELECT :seed % MAX(id) + 1 AS id FROM words
+    ),
+    un_hi AS (
+        SELECT w.id, w.word, w.level
+        FROM words w
+        LEFT JOIN user_words uw ON uw.word_id = w.id AND uw.user_id = :user_id
+        WHERE w.id >= (SELECT id FROM pivot)
+          AND uw.word_id IS NULL
+          AND TRIM(w.word) <> ''
+          AND NOT EXISTS (SELECT 1 FROM question_attempts qa
+                          WHERE qa.session_id = :session_id AND qa.word_id = w.id)
+        ORDER BY w.id
+        LIMIT 50
+    ),
+    un_lo AS (
+        SELECT w.id, w.word, w.level
+        FROM words w
+        LEFT JOIN user_words uw ON uw.word_id = w.id AND uw.user_id = :user_id
+        WHERE w.id < (SELECT id FROM pivot)
+          AND uw.word_id IS NULL
+          AND TRIM(w.word) <> ''
+          AND NOT EXISTS (SELECT 1 FROM question_attempts qa
+                          WHERE qa.session_id = :session_id AND qa.word_id = w.id)
+        ORDER BY w.id
+        LIMIT 50
+    ),
+    un AS (
+        SELECT * FROM un_hi
+        UNION ALL
+        SELECT * FROM un_lo
+        LIMIT 50
+    )
+'''
+
+# Candidates for the next preloaded question: the unseen sample plus the
+# most overdue wrongbook word (used only when no unseen word is left).
+# Filters match app.py's fallback; unlike the fallback, which picks at
+# random among due wrongbook words, the preloader takes the most overdue.
+SQL_NEXT_WORD_CANDIDATES = '''
+    WITH''' + SQL_UNSEEN_WORD_CTES + ''',
+    wb AS (
+        SELECT w.id, w.word, w.level, uw.next_review, uw.srs_interval, uw.correct_count
+        FROM user_words uw
+        JOIN words w ON w.id = uw.word_id
+        WHERE uw.user_id = :user_id AND uw.in_wrongbook = 1
+          AND (uw.next_review IS NULL OR uw.next_review <= CURRENT_TIMESTAMP)
+          AND TRIM(w.word) <> ''
+          AND NOT EXISTS (SELECT 1 FROM question_attempts qa
+                          WHERE qa.session_id = :session_id AND qa.word_id = w.id)
+        ORDER BY uw.next_review IS NOT NULL, uw.next_review ASC, RANDOM()
+        LIMIT 1
+    )
+    SELECT 'un' AS src, id, word, level,
+           NULL AS next_review, NULL AS srs_interval, NULL AS correct_count
+    FROM un
+    UNION ALL
+    SELECT 'wb', * FROM wb
+'''
+
+# Fallback sentence templates, formatted only once a template is chosen
+_SENTENCE_TEMPLATES = (
+    "The {w} is very important.",
+    "I think the {w} is interesting.",
+    "We can see the {w} here.",
+    "This {w} is quite useful.",
+    "The {w} appears frequently.",
+)
+
 @dataclass
 class PreloadedQuestion:
     """Data structure for preloaded questions"""
+    # Queued questions can pile up across sessions; slots drop the
+    # per-instance __dict__ and make attribute reads cheaper
+    __slots__ = ('word_id', 'word_txt', 'level', 'sentence', 'choices_i18n',
+                 'correct_answer_i18n', 'target_word', 'target_word_zh',
+                 'explanation_en', 'explanation_zh', 'created_at')
+
     word_id: int
     word_txt: str
     level: str
@@ -40,6 +122,9 @@ class QuestionPreloader:
     
     def __init__(self, db_path: str = "lexiboost.db"):
         self.db_path = db_path
+        # Worker threads share a few pooled connections instead of
+        # opening a new one for every generated question
+        self.db_pool = ConnectionPool(db_path, size=int(os.getenv("LEXIBOOST_PRELOAD_DB_POOL_SIZE", "4")))
         self.question_queues = {}  # session_id -> deque of PreloadedQuestion
         self.session_locks = {}    # session_id -> threading.Lock
         self.preload_threads = {}  # session_id -> threading.Thread
@@ -222,13 +307,11 @@ class QuestionPreloader:
     def _generate_question(self, session_id: int, user_id: int) -> Optional[PreloadedQuestion]:
         """Generate a single question with LLM call"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            
-            # Get next word using the same logic as the original app
-            target = self._get_next_word_for_session(conn, session_id, user_id)
+            # Get next word using the same logic as the original app; the
+            # connection goes back to the pool before the slow LLM call
+            with self.db_pool.connection() as conn:
+                target = self._get_next_word_for_session(conn, session_id, user_id)
             if not target:
-                conn.close()
                 return None
             
             word_id = target['id']
@@ -236,7 +319,6 @@ class QuestionPreloader:
             level = (target['level'] or 'k12').strip() if 'level' in target.keys() else 'k12'
             
             if not word_txt:
-                conn.close()
                 return None
             
             # Call LLM for explanation (this is the expensive operation)
@@ -276,8 +358,6 @@ class QuestionPreloader:
             
             random.shuffle(choices_i18n)
             
-            conn.close()
-            
             return PreloadedQuestion(
                 word_id=word_id,
                 word_txt=word_txt,
@@ -304,31 +384,23 @@ class QuestionPreloader:
             return None
         
         # Get next word using SRS logic
-        target = conn.execute('''
-            SELECT w.id, w.word, w.level, uw.next_review, uw.srs_interval, uw.correct_count
-            FROM words w
-            LEFT JOIN user_words uw ON w.id = uw.word_id AND uw.user_id = ?
-            WHERE (uw.in_wrongbook = 1 OR uw.in_wrongbook IS NULL)
-              AND (uw.next_review IS NULL OR uw.next_review <= CURRENT_TIMESTAMP)
-            ORDER BY 
-              CASE WHEN uw.next_review IS NULL THEN 0 ELSE 1 END,
-              uw.next_review ASC,
-              RANDOM()
-            LIMIT 1
-        ''', (user_id,)).fetchone()
+        rows = conn.execute(
+            SQL_NEXT_WORD_CANDIDATES,
+            {'session_id': session_id, 'user_id': user_id, 'seed': random.getrandbits(62)}
+        ).fetchall()
+        if not rows:
+            return None
         
-        return dict(target) if target else None
+        # Unseen words first (random pick), then the most overdue wrongbook word
+        unseen = [row for row in rows if row['src'] == 'un']
+        target = random.choice(unseen) if unseen else rows[-1]
+        target = dict(target)
+        del target['src']
+        return target
     
     def _generate_sentence_with_word(self, word: str) -> str:
         """Generate a simple sentence with the word (fallback)"""
-        templates = [
-            f"The {word} is very important.",
-            f"I think the {word} is interesting.",
-            f"We can see the {word} here.",
-            f"This {word} is quite useful.",
-            f"The {word} appears frequently."
-        ]
-        return random.choice(templates)
+        return random.choice(_SENTENCE_TEMPLATES).format(w=word)
 
 # Global instance
 question_preloader = QuestionPreloader()
\ No newline at end of file